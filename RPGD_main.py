@@ -1,121 +1,377 @@
+import glob
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 import pandas as pd
 import numpy as np
+import matplotlib
+# Only bring up GUI windows when asked to, otherwise render straight to png files
+if not os.environ.get('INTERACTIVE'):
+    matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from sklearn.metrics import mean_absolute_error
-import statsmodels.api as sm
-from prettytable import PrettyTable
+from matplotlib.colors import ListedColormap
 
+SOURCE_FILES = ('system1.csv', 'system2.csv', 'system3.csv')
+# Merged sources get saved here so re-runs on the same CSVs can skip loading and merging
+CACHE_DIR = '.cache'
+# Bump whenever merge_sources changes what it produces so older cached merges stop being used
+CACHE_VERSION = 2
+# Largest time gap between two sources' readings that still counts as the same pitch
+MATCH_TOLERANCE = pd.Timedelta('50ms')
+FIG_DPI = 120
+# Bland-Altman limits of agreement are the mean difference +/- this many SDs
+SD_LIMIT = 1.96
+# Most points drawn per Source in the correlation scatters
+MAX_SCATTER_POINTS = 5000
 
-def run(src1, src2, src3):
 
-    # Pitches appear to already be sorted by Time but let's make sure
-    src1.sort_values(by='Time')
-    src2.sort_values(by='Time')
-    src3.sort_values(by='Time')
+def read_source(path):
+    # The pyarrow parser is multi-threaded and reads the timestamps natively
+    return pd.read_csv(path, engine='pyarrow', parse_dates=['Time'])
+
+
+def sort_by_time(src):
+    # Only pay for the sort when the pitches are actually out of order. Mergesort is stable and
+    # close to linear on data that is already mostly sorted
+    if src['Time'].is_monotonic_increasing:
+        return src
+    return src.sort_values(by='Time', kind='mergesort')
+
+
+def time_ns(times):
+    # Timestamps as int64 nanoseconds since the epoch
+    return times.to_numpy(dtype='datetime64[ns]').view('i8')
+
+
+def nearest_index(t_ref, t):
+    # For each time in t find the row of t_ref (sorted) with the closest time. One binary search per probe gives
+    # the last row at or before it and the first row after it; ties go to the earlier row like merge_asof
+    after = np.searchsorted(t_ref, t, side='right')
+    before = np.clip(after - 1, 0, len(t_ref) - 1)
+    after = np.clip(after, 0, len(t_ref) - 1)
+    return np.where(t - t_ref[before] <= t_ref[after] - t, before, after)
+
+
+def merge_nearest(left, right, left_on, right_on, tolerance=None):
+    # Attach to every row of left the row of right with the nearest timestamp. Both must be sorted by time.
+    # With a tolerance, rows of left with nothing close enough get NaT/NaN instead, like merge_asof
+    if not len(right):
+        # Nothing to match against, so every row of left goes unmatched
+        matched = right.reset_index(drop=True).reindex(range(len(left)))
+        return pd.concat([left.reset_index(drop=True), matched], axis=1)
+    t, t_ref = time_ns(left[left_on]), time_ns(right[right_on])
+    idx = nearest_index(t_ref, t)
+    matched = right.iloc[idx].reset_index(drop=True)
+    if tolerance is not None:
+        matched.loc[np.abs(t_ref[idx] - t) > pd.Timedelta(tolerance).value] = np.nan
+    return pd.concat([left.reset_index(drop=True), matched], axis=1)
+
+
+def stack_axes(merged, suffix=''):
+    # X, Y and Z columns as the rows of one (3, N) float array
+    return np.stack([merged['X' + suffix].to_numpy(dtype=float), merged['Y' + suffix].to_numpy(dtype=float),
+                     merged['Z' + suffix].to_numpy(dtype=float)])
+
+
+def as_arrays(merged, suffix):
+    # Pull what the metrics and plots need out of the merged DF once, as plain NumPy arrays, leaving out the
+    # pitches that had no match. truth is Source 3 and est the other Source, both (3, N) with rows X, Y, Z
+    pitches = len(merged)
+    merged = merged.dropna(subset=['Time' + suffix])
+    return SimpleNamespace(pitches=pitches, t=merged['Time'].to_numpy(), t_src=merged['Time' + suffix].to_numpy(),
+                           truth=stack_axes(merged), est=stack_axes(merged, suffix))
+
+
+def agreement(s):
+    # Per-axis errors of a Source against Source 3, all from one difference array: the MAE and RMSE along with
+    # the Bland-Altman means, differences, mean difference and SD
+    diff = s.truth - s.est
+    n = diff.shape[1]
+    # The SD comes from the same mean square as the RMSE (var = E[d^2] - E[d]^2) rather than another pass over diff
+    md = diff.sum(axis=1) / n
+    ms = np.einsum('ij,ij->i', diff, diff) / n
+    return SimpleNamespace(mean=(s.truth + s.est) * 0.5, diff=diff, mae=np.abs(diff).mean(axis=1),
+                           rmse=np.sqrt(ms), md=md, sd=np.sqrt(np.maximum(ms - md * md, 0)))
+
+
+def bland_altman(ax, err, axis, color):
+    # Bland-Altman plot for one axis from the precomputed agreement stats, laid out like
+    # sm.graphics.mean_diff_plot (https://www.statsmodels.org/devel/generated/statsmodels.graphics.agreement.mean_diff_plot.html)
+    if err is None:
+        ax.text(0.5, 0.5, f'No pitches matched within {MATCH_TOLERANCE.total_seconds() * 1000:g}ms',
+                horizontalalignment='center', verticalalignment='center', fontsize=14, transform=ax.transAxes)
+        ax.set_axis_off()
+        return
+    md, sd = err.md[axis], err.sd[axis]
+    lower, upper = md - SD_LIMIT * sd, md + SD_LIMIT * sd
+    ax.scatter(err.mean[axis], err.diff[axis], s=20, c=color, marker='.', rasterized=True)
+    ax.axhline(md, color=color, linewidth=1, linestyle='--')
+    ax.axhline(lower, color='gray', linewidth=1, linestyle=':')
+    ax.axhline(upper, color='gray', linewidth=1, linestyle=':')
+    ax.set_ylim(md - 1.5 * SD_LIMIT * sd, md + 1.5 * SD_LIMIT * sd)
+    ax.annotate(f'mean diff:\n{md:0.3g}', xy=(0.99, 0.5), horizontalalignment='right', verticalalignment='center',
+                fontsize=14, xycoords='axes fraction')
+    ax.annotate(f'-{SD_LIMIT} SD: {lower:0.2g}', xy=(0.99, 0.07), horizontalalignment='right',
+                verticalalignment='bottom', fontsize=14, xycoords='axes fraction')
+    ax.annotate(f'+{SD_LIMIT} SD: {upper:0.2g}', xy=(0.99, 0.92), horizontalalignment='right', fontsize=14,
+                xycoords='axes fraction')
+    ax.set_ylabel('Difference', fontsize=15)
+    ax.set_xlabel('Means', fontsize=15)
+    ax.tick_params(labelsize=13)
+
+
+def thin(x, y, k=MAX_SCATTER_POINTS):
+    # Random (but repeatable) subset of at most k points, kept in their original order. Past a few thousand
+    # points the cloud looks the same and the extra markers are just drawing time
+    if len(x) <= k:
+        return x, y
+    idx = np.sort(np.random.default_rng(0).choice(len(x), k, replace=False))
+    return x[idx], y[idx]
+
+
+def as_numbers(v):
+    # Values as floats, datetimes as nanoseconds since the epoch. Missing values (NaN/NaT) come out as NaN
+    v = np.asarray(v)
+    if v.dtype.kind != 'M':
+        return v.astype(float)
+    v = v.astype('datetime64[ns]')
+    return np.where(np.isnat(v), np.nan, v.view('i8').astype(float))
+
+
+def grid_cells(v, lo, hi, n):
+    # Index (0 to n - 1) of the cell each value lands in when [lo, hi] is split into n cells
+    # A zero span (every value the same) just puts everything in cell 0
+    return ((v - lo) * ((n - 1) / ((hi - lo) or 1))).round().astype(np.int64)
+
+
+def dedupe(xs, ys, nx, ny):
+    # Points that land in the same cell of an nx by ny grid (about a pixel each) would just be drawn on top of each
+    # other, so only the first point in each cell is kept. The grid spans all of the series so they are binned alike.
+    # Points with a missing coordinate can't be drawn anyway, so they are dropped before working out the grid
+    xs_num, ys_num = [as_numbers(x) for x in xs], [as_numbers(y) for y in ys]
+    drawable = [np.flatnonzero(np.isfinite(x_num) & np.isfinite(y_num)) for x_num, y_num in zip(xs_num, ys_num)]
+    all_x = np.concatenate([x_num[i] for x_num, i in zip(xs_num, drawable)])
+    all_y = np.concatenate([y_num[i] for y_num, i in zip(ys_num, drawable)])
+    kept_x, kept_y = [], []
+    for x, y, x_num, y_num, i in zip(xs, ys, xs_num, ys_num, drawable):
+        keys = (grid_cells(x_num[i], all_x.min(), all_x.max(), nx) * ny
+                + grid_cells(y_num[i], all_y.min(), all_y.max(), ny)) if i.size else i
+        idx = i[np.sort(np.unique(keys, return_index=True)[1])]
+        kept_x.append(np.asarray(x)[idx])
+        kept_y.append(np.asarray(y)[idx])
+    return kept_x, kept_y
+
+
+def overlay_scatter(xs, ys, colors, labels):
+    # Draw several sources as one scatter (a single artist) with a color index per point rather than one plot call each.
+    # Sources with no points (nothing matched) are left out so the legend only names what is actually drawn
+    present = [i for i, x in enumerate(xs) if len(x)]
+    if not present:
+        return
+    xs, ys = [xs[i] for i in present], [ys[i] for i in present]
+    colors, labels = [colors[i] for i in present], [labels[i] for i in present]
+    nx, ny = (plt.gcf().get_size_inches() * FIG_DPI).astype(int)
+    xs, ys = dedupe(xs, ys, nx, ny)
+    xs, ys = zip(*[thin(x, y) for x, y in zip(xs, ys)])
+    c = np.repeat(np.arange(len(xs)), [len(x) for x in xs])
+    points = plt.scatter(np.concatenate(xs), np.concatenate(ys), c=c, cmap=ListedColormap(colors), vmin=-0.5,
+                         vmax=len(colors) - 0.5, marker='.', rasterized=True)
+    plt.legend(points.legend_elements()[0], labels)
+
+
+def save_figure(f, fname):
+    # Save the figure and close it so it is not drawn over by (or leaked into) the next run. Interactive
+    # sessions keep them open for the plt.show() at the end
+    f.savefig(fname, dpi=FIG_DPI)
+    if not os.environ.get('INTERACTIVE'):
+        plt.close(f)
+
+
+def print_table(title, header, rows):
+    # Plain text table with right-aligned columns, numbers to 4 decimal places
+    cells = [header] + [[f'{v:.4f}' if isinstance(v, float) else str(v) for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    line = ' | '.join(f'{{:>{w}}}' for w in widths)
+    print(title)
+    print(line.format(*cells[0]))
+    print('-+-'.join('-' * w for w in widths))
+    for row in cells[1:]:
+        print(line.format(*row))
+    print()
+
+
+def merge_sources(src1, src2, src3):
+    # Match every Source 3 pitch to the nearest Source 1 and Source 2 pitch in time
+
+    # Pitches appear to already be sorted by Time but let's make sure (the merge needs sorted times)
+    src1 = sort_by_time(src1)
+    src2 = sort_by_time(src2)
+    src3 = sort_by_time(src3)
 
     # Rename columns so they are easier to keep track of when merging
-    src1 = src1.rename(columns={"Time": "Time_1", "X": "X_1", "Y": "Y_1", "Z": "Z_1"})
-    src2 = src2.rename(columns={"Time": "Time_2", "x": "X_2", "y": "Y_2", "z": "Z_2"})
+    # Only the time and position columns (plus the Source 3 reported error) get carried through the merge
+    src1 = src1.rename(columns={"Time": "Time_1", "X": "X_1", "Y": "Y_1", "Z": "Z_1"})[['Time_1', 'X_1', 'Y_1', 'Z_1']]
+    src2 = src2.rename(columns={"Time": "Time_2", "x": "X_2", "y": "Y_2", "z": "Z_2"})[['Time_2', 'X_2', 'Y_2', 'Z_2']]
+    positions = src3[['Time', 'X', 'Y', 'Z', 'Xrange', 'Yrange', 'Zrange']]
 
-    # Merge the DFs together using the nearest timestamp
+    # Merge the DFs together using the nearest timestamp, same as merge_asof(direction='nearest', tolerance=...)
     # (https://pandas.pydata.org/pandas-docs/version/0.25.0/reference/api/pandas.merge_asof.html)
-    src1_3 = pd.merge_asof(src3, src1, left_on='Time', right_on="Time_1", direction='nearest')
-    src2_3 = pd.merge_asof(src3, src2, left_on='Time', right_on="Time_2", direction='nearest')
+    # Anything further apart than MATCH_TOLERANCE is a different pitch, so those are left unmatched rather
+    # than counted as a huge error
+    src1_3 = merge_nearest(positions, src1, left_on='Time', right_on='Time_1', tolerance=MATCH_TOLERANCE)
+    src2_3 = merge_nearest(positions, src2, left_on='Time', right_on='Time_2', tolerance=MATCH_TOLERANCE)
+    return src1_3, src2_3
+
+
+def load_merged(paths, cache_dir=CACHE_DIR):
+    # Load the three sources and merge them, or reuse the merge from an earlier run if none of the CSVs changed since
+    key = [CACHE_VERSION, MATCH_TOLERANCE] + [(p, os.path.getmtime(p)) for p in paths]
+    key = hashlib.sha1(str(key).encode()).hexdigest()[:12]
+    cached = [os.path.join(cache_dir, f'{key}_{i}_3.parquet') for i in (1, 2)]
+    if all(os.path.exists(c) for c in cached):
+        return tuple(pd.read_parquet(c) for c in cached)
+
+    # The files are parsed side by side since the pyarrow parser does its work outside the GIL
+    with ThreadPoolExecutor(len(paths)) as pool:
+        merged = merge_sources(*pool.map(read_source, paths))
+    os.makedirs(cache_dir, exist_ok=True)
+    # Merges cached for older versions of the CSVs will never be hit again, so clear them out
+    for old in glob.glob(os.path.join(cache_dir, '*_3.parquet')):
+        if old not in cached:
+            os.remove(old)
+    # Write to a temp file and move it into place so a run that dies mid-write never leaves a partial cache behind
+    for df, c in zip(merged, cached):
+        tmp = f'{c}.{os.getpid()}.tmp'
+        df.to_parquet(tmp, compression='zstd')
+        os.replace(tmp, c)
+    return merged
+
+
+def measure(src1_3, src2_3):
+    # All the number crunching on the merged sources, no plotting
+    s1 = as_arrays(src1_3, '_1')
+    s2 = as_arrays(src2_3, '_2')
+
+    # Calculate MAE and RMSE for each Source and axis, all three axes in one pass over each Source. The Bland-Altman
+    # stats come out of the same differences. A Source with no matched pitches at all gets None instead
+    return {
+        's1': s1,
+        's2': s2,
+        'err1': agreement(s1) if len(s1.t) else None,
+        'err2': agreement(s2) if len(s2.t) else None,
+        # Source 3 uses the mean of its reported error
+        'src3_error': src1_3[['Xrange', 'Yrange', 'Zrange']].mean().to_numpy(),
+    }
+
+
+def compute(src1, src2, src3):
+    return measure(*merge_sources(src1, src2, src3))
+
+
+def report(r):
+    sources = [("Source 1", r['s1'], r['err1']), ("Source 2", r['s2'], r['err2'])]
+
+    # Pitches with nothing within MATCH_TOLERANCE are left out of everything below, so say how many that was.
+    # Lots of them usually means the clocks are offset or one system missed pitches
+    tolerance_ms = f'{MATCH_TOLERANCE.total_seconds() * 1000:g}ms'
+    for name, s, err in sources:
+        print(f'{name}: matched {len(s.t)} of {s.pitches} Source 3 pitches within {tolerance_ms}, '
+              f'dropped {s.pitches - len(s.t)}' + ('' if err else ' (no matches, left out of the stats and plots)'))
+    print()
+
+    # Take the MAE values and create a simple table to compare values. Source 3 uses the mean of its reported error
+    print_table('Mean Absolute Error', ["Source ID", "X-axis", "Y-axis", "Z-axis"],
+                [[name, *err.mae] for name, _, err in sources if err] + [["Source 3", *r['src3_error']]])
+
+    # RMSE weights the bigger misses more heavily than MAE. Source 3 has no equivalent so it is left out
+    rmse_rows = [[name, *err.rmse] for name, _, err in sources if err]
+    if rmse_rows:
+        print_table('Root Mean Squared Error', ["Source ID", "X-axis", "Y-axis", "Z-axis"], rmse_rows)
+
+
+def plot(r):
+    s1, s2, err1, err2 = r['s1'], r['s2'], r['err1'], r['err2']
 
     # Check to see how well the timestamps line up to visually identify any bad matches
-    plt.figure(1, figsize=(12, 8))
-    plt.plot(src1_3['Time'], src1_3['Time_1'], 'b.', label='Source 1')
-    plt.plot(src2_3['Time'], src2_3['Time_2'], 'r.', label='Source 2')
+    f = plt.figure(figsize=(12, 8))
+    overlay_scatter([s1.t, s2.t], [s1.t_src, s2.t_src], ['b', 'r'], ['Source 1', 'Source 2'])
     plt.xlabel('Source 3')
     plt.ylabel('Source 1 and Source 2')
-    plt.legend()
     plt.title('Timestamp Correlations to Source 3')
-    plt.show()
+    save_figure(f, 'timestamp_correlations.png')
 
     # Plot each of the x,y,z points to get an idea how they data is matching up and which Source is performing better
     # Source 2 appears to have a significant advantage here
-    plt.figure(2)
-    plt.plot(src1_3['X'], src1_3['X_1'], 'b.', label='Source 1')
-    plt.plot(src2_3['X'], src2_3['X_2'], 'r.', label='Source 2')
+    f = plt.figure()
+    overlay_scatter([s1.truth[0], s2.truth[0]], [s1.est[0], s2.est[0]], ['b', 'r'], ['Source 1', 'Source 2'])
     plt.xlabel('Source 3')
     plt.ylabel('Source 1 and Source 2')
-    plt.legend()
     plt.title('X-axis Correlations to Source 3')
-    plt.show()
+    save_figure(f, 'x_correlations.png')
 
     # Source 2 still looks better but the correlation to Source 3 is not as strong
-    plt.figure(3)
-    plt.plot(src1_3['Y'], src1_3['Y_1'], 'b.', label='Source 1')
-    plt.plot(src2_3['Y'], src2_3['Y_2'], 'r.', label='Source 2')
+    f = plt.figure()
+    overlay_scatter([s1.truth[1], s2.truth[1]], [s1.est[1], s2.est[1]], ['b', 'r'], ['Source 1', 'Source 2'])
     plt.xlabel('Source 3')
     plt.ylabel('Source 1 and Source 2')
-    plt.legend()
     plt.title('Y-axis Correlations to Source 3')
-    plt.show()
+    save_figure(f, 'y_correlations.png')
 
     # Source 2 is much better than Source 1 for the z-axis also
-    plt.figure(4)
-    plt.plot(src1_3['Z'], src1_3['Z_1'], 'b.', label='Source 1')
-    plt.plot(src2_3['Z'], src2_3['Z_2'], 'r.', label='Source 2')
+    f = plt.figure()
+    overlay_scatter([s1.truth[2], s2.truth[2]], [s1.est[2], s2.est[2]], ['b', 'r'], ['Source 1', 'Source 2'])
     plt.xlabel('Source 3')
     plt.ylabel('Source 1 and Source 2')
-    plt.legend()
     plt.title('Z-axis Correlations to Source 3')
-    plt.show()
-
-    # Calculate MAE for each Source and axis
-    MAE1_3_x = mean_absolute_error(src1_3['X'], src1_3['X_1'])
-    MAE1_3_y = mean_absolute_error(src1_3['Y'], src1_3['Y_1'])
-    MAE1_3_z = mean_absolute_error(src1_3['Z'], src1_3['Z_1'])
-    MAE2_3_x = mean_absolute_error(src2_3['X'], src2_3['X_2'])
-    MAE2_3_y = mean_absolute_error(src2_3['Y'], src2_3['Y_2'])
-    MAE2_3_z = mean_absolute_error(src2_3['Z'], src2_3['Z_2'])
-
-    # Take the MAE values and create a simple table to compare values. Source 3 uses the mean of its reported error
-    MAE = PrettyTable()
-    MAE.field_names = ["Source ID", "X-axis", "Y-axis", "Z-axis"]
-    MAE.add_rows(
-        [
-            ["Source 1", round(MAE1_3_x, 4), round(MAE1_3_y, 4), round(MAE1_3_z, 4)],
-            ["Source 2", round(MAE2_3_x, 4), round(MAE2_3_y, 4), round(MAE2_3_z, 4)],
-            ["Source 3", round(np.mean(src3['Xrange']), 4), round(np.mean(src3['Yrange']), 4), round(np.mean(src3['Zrange']), 4)],
-        ]
-    )
-    print(MAE)
+    save_figure(f, 'z_correlations.png')
 
     # Visualize Source comparisons using a Bland-Altman plot
     # To make things easier to pair I put the two sources as subplots, grouped by the axis
-    # (https://www.statsmodels.org/devel/generated/statsmodels.graphics.agreement.mean_diff_plot.html)
     f, ax = plt.subplots(2,1, figsize=(12,8))
-    sm.graphics.mean_diff_plot(src1_3['X'], src1_3['X_1'], ax=ax[0], scatter_kwds={'c': 'b', 'marker': '.'}, mean_line_kwds={'c': 'b'})
-    sm.graphics.mean_diff_plot(src2_3['X'], src2_3['X_2'], ax=ax[1], scatter_kwds={'c': 'r', 'marker': '.'}, mean_line_kwds={'c': 'r'})
+    bland_altman(ax[0], err1, 0, 'b')
+    bland_altman(ax[1], err2, 0, 'r')
     f.suptitle('Bland-Alman plot for the X-axis', va='top')
     ax[0].set_title('Source 1')
     ax[1].set_title('Source 2')
     plt.tight_layout()
-    plt.show()
+    save_figure(f, 'bland_altman_x.png')
 
     f, ax = plt.subplots(2,1, figsize=(12, 8))
-    sm.graphics.mean_diff_plot(src1_3['Y'], src1_3['Y_1'], ax=ax[0], scatter_kwds={'c': 'b', 'marker': '.'}, mean_line_kwds={'c': 'b'})
-    sm.graphics.mean_diff_plot(src2_3['Y'], src2_3['Y_2'], ax=ax[1], scatter_kwds={'c': 'r', 'marker': '.'}, mean_line_kwds={'c': 'r'})
+    bland_altman(ax[0], err1, 1, 'b')
+    bland_altman(ax[1], err2, 1, 'r')
     f.suptitle('Bland-Alman plot for the Y-axis')
     ax[0].set_title('Source 1')
     ax[1].set_title('Source 2')
     plt.tight_layout()
-    plt.show()
+    save_figure(f, 'bland_altman_y.png')
 
     f, ax = plt.subplots(2,1, figsize=(12, 8))
-    sm.graphics.mean_diff_plot(src1_3['Z'], src1_3['Z_1'], ax=ax[0], scatter_kwds={'c': 'b', 'marker': '.'}, mean_line_kwds={'c': 'b'})
-    sm.graphics.mean_diff_plot(src2_3['Z'], src2_3['Z_2'], ax=ax[1], scatter_kwds={'c': 'r', 'marker': '.'}, mean_line_kwds={'c': 'r'})
+    bland_altman(ax[0], err1, 2, 'b')
+    bland_altman(ax[1], err2, 2, 'r')
     f.suptitle('Bland-Alman plot for the Z-axis')
     ax[0].set_title('Source 1')
     ax[1].set_title('Source 2')
     plt.tight_layout()
-    plt.show()
+    save_figure(f, 'bland_altman_z.png')
+
+    if os.environ.get('INTERACTIVE'):
+        plt.show()
+
+
+def run_merged(src1_3, src2_3, do_plot=True):
+    r = measure(src1_3, src2_3)
+    report(r)
+    if do_plot:
+        plot(r)
+    return r
+
+
+def run(src1, src2, src3, do_plot=True):
+    return run_merged(*merge_sources(src1, src2, src3), do_plot=do_plot)
+
 
 if __name__ == "__main__":
     # I saved the data as individual csv files and load them here before passing into the main processing
-    source1_raw = pd.read_csv('system1.csv', parse_dates=['Time'])
-    source2_raw = pd.read_csv('system2.csv', parse_dates=['Time'])
-    source3_raw = pd.read_csv('system3.csv', parse_dates=['Time'])
-    run(source1_raw, source2_raw, source3_raw)
\ No newline at end of file
+    # Set NO_PLOT to just get the error tables, e.g. for batch runs
+    run_merged(*load_merged(SOURCE_FILES), do_plot=not os.environ.get('NO_PLOT'))